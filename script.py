@@ -5,29 +5,57 @@ monster-siren.hypergryph.com, downloads audio/background/album art, and
 embeds tags (artist, album, cover) into the audio files.
 
 Usage (PowerShell):
-	python script.py
+	python script.py [--refresh]
+
+Album and song details are cached under metadata/cache/; pass --refresh to
+revalidate them against the server (cheap 304s for anything unchanged).
 
 Dependencies:
-	pip install requests mutagen pydub
-	# pydub needs ffmpeg available on PATH.
+	pip install requests "httpx[http2]" mutagen
+	# WAV -> FLAC conversion needs ffmpeg available on PATH.
+	# Optional: pip install orjson  (faster metadata JSON writes)
 """
 
 from __future__ import annotations
 
+import argparse
+import asyncio
+import atexit
+import errno
+import hashlib
 import json
 import logging
+import mmap
+import os
+import queue
 import re
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import shutil
+import subprocess
+import threading
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from functools import partial
+from io import BytesIO
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Tuple
+from types import ModuleType
+from typing import Any, Dict, List, Optional, Set, Tuple, Union
 from urllib.parse import urlparse
 
+import httpx
 import requests
+from requests.adapters import HTTPAdapter
 from mutagen import File as MutagenFile
+from mutagen import MutagenError
 from mutagen.flac import FLAC, Picture
 from mutagen.id3 import APIC, ID3, ID3NoHeaderError, TALB, TIT2, TPE1, TRCK
 from mutagen.mp4 import MP4, MP4Cover
-from pydub import AudioSegment
+from urllib3.util.retry import Retry
+
+orjson: Optional[ModuleType]
+try:
+	import orjson
+except ImportError:
+	orjson = None
 
 
 BASE_URL = "https://monster-siren.hypergryph.com/api"
@@ -45,73 +73,209 @@ HEADERS = {
 }
 
 
+# (song record, album name, cover key, on disk before this run) ready to be converted/tagged.
+TagJob = Tuple[Dict[str, Any], str, Optional[str], bool]
+# (url, destination, song to tag once the file is on disk).
+DownloadJob = Tuple[str, Path, Optional[TagJob]]
+# Cover art as handed to the taggers; covers shared by many tracks are mapped.
+CoverData = Union[bytes, mmap.mmap]
+
+
 ROOT = Path(__file__).resolve().parent
 SONGS_DIR = ROOT / "songs"
 METADATA_DIR = ROOT / "metadata"
+# Album covers stored once per distinct URL and linked into album folders.
+COVERS_DIR = ROOT / "covers"
+# Partial downloads live here until they are complete, then get renamed into place.
+STAGING_DIR = ROOT / ".staging"
+CACHE_DIR = METADATA_DIR / "cache"
+ETAGS_FILE = CACHE_DIR / "etags.json"
+
+# URL -> ETag of the response body stored in CACHE_DIR.
+ETAG_CACHE: Dict[str, str] = {}
+
+# Metadata requests are tiny and latency bound, so multiplex many of them
+# over a handful of HTTP/2 connections.
+METADATA_CONCURRENCY = 32
+DOWNLOAD_WORKERS = 16
+# ffmpeg does the CPU work in its own process, so plain threads are enough
+# to keep one conversion running per core.
+CONVERT_WORKERS = os.cpu_count() or 1
+TAG_WORKERS = 8
+TAG_BACKLOG = 2 * (TAG_WORKERS + CONVERT_WORKERS)
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+# Audio is already compressed; asking for gzip only burns CPU on both ends.
+AUDIO_EXTENSIONS = {".mp3", ".m4a", ".mp4", ".aac", ".wav", ".flac"}
+
+
+_ELLIPSIS_RE = re.compile(r"\.\.\.|…")
+_ILLEGAL_RE = re.compile(r'[\\/:*?"<>|]')
+_WS_RE = re.compile(r"\s+")
+_TRACK_RE = re.compile(r"(\d{2,}) - ")
 
 
 def slugify(name: str) -> str:
 	"""Return a filesystem-friendly slug while preserving readability."""
 
-	cleaned = name.replace("...", "").replace("…", "")
-	cleaned = re.sub(r"[\\/:*?\"<>|]", " ", cleaned)
-	cleaned = re.sub(r"\s+", " ", cleaned).strip()
-	return cleaned or "unknown"
+	return _WS_RE.sub(" ", _ILLEGAL_RE.sub(" ", _ELLIPSIS_RE.sub("", name))).strip() or "unknown"
 
 
 def ensure_dirs() -> None:
 	SONGS_DIR.mkdir(parents=True, exist_ok=True)
 	METADATA_DIR.mkdir(parents=True, exist_ok=True)
+	COVERS_DIR.mkdir(parents=True, exist_ok=True)
+	STAGING_DIR.mkdir(parents=True, exist_ok=True)
+	# Anything left over is from an interrupted run.
+	for leftover in STAGING_DIR.iterdir():
+		leftover.unlink()
+
+
+def staging_file() -> Path:
+	return STAGING_DIR / uuid.uuid4().hex
+
+
+def move_into_place(tmp: Path, dest: Path) -> None:
+	"""Rename a finished staging file to ``dest``, even across volumes."""
+
+	try:
+		os.replace(tmp, dest)
+	except OSError as exc:
+		if exc.errno != errno.EXDEV:
+			raise
+		# songs/ or covers/ may be a junction/symlink onto another volume: copy
+		# next to the destination first so the final rename stays atomic.
+		part = dest.with_name(f"{dest.name}.{uuid.uuid4().hex}.part")
+		try:
+			shutil.move(str(tmp), str(part))
+			os.replace(part, dest)
+		except BaseException:
+			part.unlink(missing_ok=True)
+			raise
+
+
+def read_cache(cache_file: Path) -> Optional[Any]:
+	"""Return the payload stored in ``cache_file``, or None if it is missing or unreadable."""
+
+	try:
+		return json.loads(cache_file.read_text(encoding="utf-8"))
+	except FileNotFoundError:
+		return None
+	except ValueError:
+		# Left truncated by an interrupted run; treat it as a miss.
+		logging.warning("Ignoring corrupt cache file %s", cache_file)
+		cache_file.unlink(missing_ok=True)
+		return None
+
+
+def load_etags() -> None:
+	ETAG_CACHE.update(read_cache(ETAGS_FILE) or {})
+
 
+def save_etags() -> None:
+	save_json(ETAGS_FILE, ETAG_CACHE)
+
+
+async def fetch_json_async(client: httpx.AsyncClient, path: str, cache_file: Path) -> Any:
+	"""GET an API path, revalidating the copy in ``cache_file`` by ETag.
+
+	A 304 returns the cached payload; a fresh body replaces the cache file.
+	"""
 
-def fetch_json(session: requests.Session, path: str) -> Any:
 	url = f"{BASE_URL}/{path.lstrip('/')}"
-	resp = session.get(url, timeout=30)
+	headers: Dict[str, str] = {}
+	etag = ETAG_CACHE.get(url)
+	cached = read_cache(cache_file) if etag else None
+	if etag and cached is not None:
+		headers["If-None-Match"] = etag
+	resp = await client.get(url, timeout=30, headers=headers)
+	if resp.status_code == 304 and cached is not None:
+		return cached
 	resp.raise_for_status()
 	data = resp.json()
 	# API usually wraps payload under "data"; fall back to whole body.
-	return data.get("data", data)
+	data = data.get("data", data)
+	save_json(cache_file, data)
+	etag = resp.headers.get("ETag")
+	if etag:
+		ETAG_CACHE[url] = etag
+	else:
+		ETAG_CACHE.pop(url, None)
+	return data
 
 
-def download_binary(session: requests.Session, url: str, dest: Path) -> None:
-	dest.parent.mkdir(parents=True, exist_ok=True)
-	if dest.exists():
-		return
-	with session.get(url, stream=True, timeout=60) as resp:
+async def fetch_json_cached(client: httpx.AsyncClient, path: str, cache_key: str, refresh: bool = False) -> Any:
+	"""Like fetch_json_async, but skip the request entirely on a cache hit."""
+
+	cache_file = CACHE_DIR / cache_key
+	if not refresh:
+		cached = read_cache(cache_file)
+		if cached is not None:
+			return cached
+	return await fetch_json_async(client, path, cache_file)
+
+
+def open_stream(session: requests.Session, url: str, dest: Path) -> requests.Response:
+	headers = {"Accept-Encoding": "identity"} if dest.suffix.lower() in AUDIO_EXTENSIONS else None
+	resp = session.get(url, stream=True, timeout=60, headers=headers)
+	try:
 		resp.raise_for_status()
-		tmp = dest.with_suffix(dest.suffix + ".part")
-		with tmp.open("wb") as fh:
-			for chunk in resp.iter_content(chunk_size=8192):
-				if chunk:
-					fh.write(chunk)
-		tmp.replace(dest)
+	except requests.HTTPError:
+		resp.close()
+		raise
+	# Only decode when the server actually compressed the body.
+	resp.raw.decode_content = bool(resp.headers.get("Content-Encoding"))
+	return resp
+
+
+def warm_connection(session: requests.Session, origin: str) -> None:
+	"""Open (DNS + TCP + TLS) a pooled connection to ``origin`` ahead of the downloads.
 
+	Best effort, and nothing waits on it: a dead host only costs this thread.
+	"""
 
-def pick_url(record: Dict[str, Any], *keys: str) -> Optional[str]:
+	try:
+		# session.head reads the (empty) body, so the live connection goes back to the pool.
+		session.head(origin, timeout=5)
+	except requests.RequestException as exc:
+		logging.debug("Could not warm up %s: %s", origin, exc)
+
+
+def download_binary(session: requests.Session, url: str, dest: Path) -> None:
+	"""Download ``url`` to ``dest``; callers only queue files that are missing."""
+
+	tmp = staging_file()
+	try:
+		with open_stream(session, url, dest) as resp, tmp.open("wb") as fh:
+			shutil.copyfileobj(resp.raw, fh, length=DOWNLOAD_CHUNK_SIZE)
+		move_into_place(tmp, dest)
+	except BaseException:
+		tmp.unlink(missing_ok=True)
+		raise
+
+
+_COVER_KEYS = ("coverUrl", "cover", "coverUrlLg", "coverUrlSm", "bgCover")
+_BG_KEYS = ("backgroundUrl", "bgUrl", "wallpaper")
+_AUDIO_KEYS = ("sourceUrl", "source", "url")
+
+
+def pick_url(record: Dict[str, Any], keys: Tuple[str, ...]) -> Optional[str]:
 	for key in keys:
 		url = record.get(key)
-		if isinstance(url, str) and url.startswith("http"):
+		if url.__class__ is str and url[:4] == "http":
 			return url
 	return None
 
 
 def extract_album_cover(album: Dict[str, Any]) -> Optional[str]:
-	return pick_url(
-		album,
-		"coverUrl",
-		"cover",
-		"coverUrlLg",
-		"coverUrlSm",
-		"bgCover",
-	)
+	return pick_url(album, _COVER_KEYS)
 
 
 def extract_background(album: Dict[str, Any]) -> Optional[str]:
-	return pick_url(album, "backgroundUrl", "bgUrl", "wallpaper")
+	return pick_url(album, _BG_KEYS)
 
 
 def extract_song_audio(song: Dict[str, Any]) -> Optional[str]:
-	return pick_url(song, "sourceUrl", "source", "url")
+	return pick_url(song, _AUDIO_KEYS)
 
 
 def parse_extension_from_url(url: str) -> str:
@@ -120,33 +284,104 @@ def parse_extension_from_url(url: str) -> str:
 	return ext if ext else ".m4a"
 
 
-def tag_mp3(path: Path, title: str, album: str, artists: List[str], track_no: int, cover_bytes: bytes) -> None:
-	try:
-		audio = ID3(path)
-	except ID3NoHeaderError:
-		audio = ID3()
+def build_id3(
+	title: str,
+	album: str,
+	artists: List[str],
+	track_no: int,
+	cover_bytes: Optional[CoverData],
+	source: Union[Path, BytesIO, None] = None,
+) -> ID3:
+	"""Return an ID3 tag with our frames, on top of ``source``'s existing tag if given."""
+
+	audio = ID3()
+	if source is not None:
+		try:
+			audio = ID3(source)
+		except ID3NoHeaderError:
+			pass
 	audio.add(TIT2(encoding=3, text=title))
 	audio.add(TALB(encoding=3, text=album))
 	audio.add(TPE1(encoding=3, text=artists))
 	audio.add(TRCK(encoding=3, text=str(track_no)))
-	audio.add(APIC(encoding=3, mime="image/jpeg", type=3, desc="Cover", data=cover_bytes))
-	audio.save(path)
-
-
-def tag_wav(path: Path, title: str, album: str, artists: List[str], track_no: int, cover_bytes: bytes) -> None:
+	if cover_bytes:
+		audio.add(APIC(encoding=3, mime="image/jpeg", type=3, desc="Cover", data=bytes(cover_bytes)))
+	return audio
+
+
+def tag_mp3(path: Path, title: str, album: str, artists: List[str], track_no: int, cover_bytes: CoverData) -> None:
+	build_id3(title, album, artists, track_no, cover_bytes, path).save(path)
+
+
+def read_id3_header(stream: Any) -> Tuple[bytes, bytes]:
+	"""Consume a leading ID3v2 tag from ``stream``.
+
+	Returns the raw tag (empty if there is none) and whatever was read that
+	belongs to the audio itself.
+	"""
+
+	head = stream.read(10)
+	if len(head) < 10 or not head.startswith(b"ID3"):
+		return b"", head
+	# Tag size is a 28-bit synchsafe integer, excluding the 10-byte header.
+	remaining = (head[6] << 21) | (head[7] << 14) | (head[8] << 7) | head[9]
+	if head[5] & 0x10:
+		remaining += 10  # footer
+	chunks = [head]
+	while remaining > 0:
+		chunk = stream.read(min(remaining, DOWNLOAD_CHUNK_SIZE))
+		if not chunk:
+			break
+		chunks.append(chunk)
+		remaining -= len(chunk)
+	return b"".join(chunks), b""
+
+
+def tag_mp3_stream(
+	session: requests.Session,
+	url: str,
+	dest: Path,
+	title: str,
+	album: str,
+	artists: List[str],
+	track_no: int,
+	cover_bytes: Optional[CoverData],
+) -> None:
+	"""Download an MP3 with our ID3 tag written in front of the audio.
+
+	Saves the separate open/parse/rewrite pass tag_mp3 would need afterwards.
+	Like tag_mp3, our frames go on top of any ID3v2 tag the server sent.
+	"""
+
+	tmp = staging_file()
 	try:
-		audio = ID3(path)
-	except ID3NoHeaderError:
-		audio = ID3()
-	audio.add(TIT2(encoding=3, text=title))
-	audio.add(TALB(encoding=3, text=album))
-	audio.add(TPE1(encoding=3, text=artists))
-	audio.add(TRCK(encoding=3, text=str(track_no)))
-	audio.add(APIC(encoding=3, mime="image/jpeg", type=3, desc="Cover", data=cover_bytes))
-	audio.save(path)
-
-
-def tag_m4a(path: Path, title: str, album: str, artists: List[str], track_no: int, cover_bytes: bytes) -> None:
+		with open_stream(session, url, dest) as resp, tmp.open("wb") as fh:
+			server_tag, audio_start = read_id3_header(resp.raw)
+			try:
+				tags = build_id3(
+					title, album, artists, track_no, cover_bytes, BytesIO(server_tag) if server_tag else None
+				)
+			except MutagenError as exc:
+				logging.warning("Dropping unreadable ID3 tag from %s: %s", url, exc)
+				tags = build_id3(title, album, artists, track_no, cover_bytes)
+			header = BytesIO()
+			tags.save(header)
+			fh.write(header.getvalue())
+			fh.write(audio_start)
+			shutil.copyfileobj(resp.raw, fh, length=DOWNLOAD_CHUNK_SIZE)
+		move_into_place(tmp, dest)
+	except BaseException:
+		tmp.unlink(missing_ok=True)
+		raise
+	if cover_bytes:
+		tag_marker(dest).touch()
+
+
+def tag_wav(path: Path, title: str, album: str, artists: List[str], track_no: int, cover_bytes: CoverData) -> None:
+	build_id3(title, album, artists, track_no, cover_bytes, path).save(path)
+
+
+def tag_m4a(path: Path, title: str, album: str, artists: List[str], track_no: int, cover_bytes: CoverData) -> None:
 	audio = MP4(path)
 	audio["\xa9nam"] = [title]
 	audio["\xa9alb"] = [album]
@@ -156,7 +391,7 @@ def tag_m4a(path: Path, title: str, album: str, artists: List[str], track_no: in
 	audio.save()
 
 
-def tag_flac(path: Path, title: str, album: str, artists: List[str], track_no: int, cover_bytes: bytes) -> None:
+def tag_flac(path: Path, title: str, album: str, artists: List[str], track_no: int, cover_bytes: CoverData) -> None:
 	audio = FLAC(path)
 	audio["title"] = [title]
 	audio["album"] = [album]
@@ -172,11 +407,60 @@ def tag_flac(path: Path, title: str, album: str, artists: List[str], track_no: i
 	audio.save()
 
 
-def apply_tags(path: Path, title: str, album: str, artists: List[str], track_no: int, cover_path: Optional[Path]) -> None:
-	cover_bytes: Optional[bytes] = None
-	if cover_path and cover_path.exists():
-		cover_bytes = cover_path.read_bytes()
-	else:
+def tag_marker(path: Path) -> Path:
+	"""Marker file recording that ``path`` has been fully tagged."""
+
+	return path.with_suffix(path.suffix + ".tagged")
+
+
+def is_tagged(path: Path) -> bool:
+	marker = tag_marker(path)
+	try:
+		# A marker older than the file means the file was replaced since.
+		return marker.stat().st_mtime >= path.stat().st_mtime
+	except FileNotFoundError:
+		return False
+
+
+def has_current_tags(path: Path, title: str) -> bool:
+	"""Cheaply check whether ``path`` already carries our title and a cover.
+
+	Covers the files tagged before markers existed. FLAC has no cheap check and
+	relies on the marker alone.
+	"""
+
+	ext = path.suffix.lower()
+	try:
+		if ext in {".mp3", ".wav"}:
+			# translate=False skips upgrading/normalising frames we do not look at.
+			tags = ID3(path, translate=False)
+			tit2 = tags.get("TIT2")
+			return tit2 is not None and list(tit2.text) == [title] and bool(tags.getall("APIC"))
+		if ext in {".m4a", ".mp4", ".aac"}:
+			# MP4() still parses the whole ilst, covr included; this only saves the rewrite.
+			mp4_tags = MP4(path).tags
+			return mp4_tags is not None and mp4_tags.get("\xa9nam") == [title] and "covr" in mp4_tags
+	except MutagenError:
+		return False
+	return False
+
+
+def apply_tags(
+	path: Path,
+	title: str,
+	album: str,
+	artists: List[str],
+	track_no: int,
+	cover_bytes: Optional[CoverData],
+	preexisting: bool = False,
+) -> None:
+	if is_tagged(path):
+		return
+	# Fresh downloads may carry server tags with our title; never trust those.
+	if preexisting and cover_bytes and has_current_tags(path, title):
+		tag_marker(path).touch()
+		return
+	if not cover_bytes:
 		logging.warning("No cover art found for %s", path)
 
 	ext = path.suffix.lower()
@@ -198,6 +482,9 @@ def apply_tags(path: Path, title: str, album: str, artists: List[str], track_no:
 		audio["album"] = album
 		audio["artist"] = artists
 		audio.save()
+		# Leave it unmarked so the cover gets embedded once it is available.
+		return
+	tag_marker(path).touch()
 
 
 def convert_wav_to_flac(wav_path: Path) -> Optional[Path]:
@@ -210,18 +497,35 @@ def convert_wav_to_flac(wav_path: Path) -> Optional[Path]:
 		logging.warning("WAV missing for conversion: %s", wav_path)
 		return None
 	logging.info("Converting to FLAC: %s", wav_path.name)
-	audio = AudioSegment.from_file(wav_path)
-	audio.export(flac_path, format="flac")
+	tmp = flac_path.with_suffix(flac_path.suffix + ".part")
+	subprocess.run(
+		["ffmpeg", "-y", "-i", str(wav_path), "-c:a", "flac", "-compression_level", "5", "-f", "flac", str(tmp)],
+		check=True,
+		capture_output=True,
+	)
+	tmp.replace(flac_path)
 	return flac_path
 
 
 def save_json(path: Path, data: Any) -> None:
 	path.parent.mkdir(parents=True, exist_ok=True)
-	path.write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding="utf-8")
-
-
-def fetch_all_albums(session: requests.Session) -> List[Dict[str, Any]]:
-	albums = fetch_json(session, "albums")
+	# Write next to the target and rename, so an interrupted run never leaves
+	# a truncated file behind.
+	tmp = path.with_name(f"{path.name}.{uuid.uuid4().hex}.tmp")
+	try:
+		if orjson is not None:
+			tmp.write_bytes(orjson.dumps(data, option=orjson.OPT_INDENT_2))
+		else:
+			tmp.write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding="utf-8")
+		os.replace(tmp, path)
+	except BaseException:
+		tmp.unlink(missing_ok=True)
+		raise
+
+
+async def fetch_all_albums(client: httpx.AsyncClient) -> List[Dict[str, Any]]:
+	# Always revalidated, otherwise new albums would never show up.
+	albums = await fetch_json_async(client, "albums", CACHE_DIR / "albums.json")
 	if isinstance(albums, dict) and "list" in albums:
 		return albums.get("list", [])
 	if isinstance(albums, list):
@@ -229,52 +533,48 @@ def fetch_all_albums(session: requests.Session) -> List[Dict[str, Any]]:
 	raise RuntimeError("Unexpected albums payload")
 
 
-def fetch_album_detail(session: requests.Session, album_id: str) -> Dict[str, Any]:
-	detail = fetch_json(session, f"album/{album_id}/detail")
+async def fetch_album_detail(client: httpx.AsyncClient, album_id: str, refresh: bool = False) -> Dict[str, Any]:
+	detail = await fetch_json_cached(client, f"album/{album_id}/detail", f"album/{album_id}.json", refresh)
 	if isinstance(detail, dict):
 		return detail
 	raise RuntimeError(f"Unexpected album detail payload for {album_id}")
 
 
-def fetch_song_detail(session: requests.Session, song_id: str) -> Dict[str, Any]:
-	detail = fetch_json(session, f"song/{song_id}")
+async def fetch_song_detail(client: httpx.AsyncClient, song_id: str, refresh: bool = False) -> Dict[str, Any]:
+	detail = await fetch_json_cached(client, f"song/{song_id}", f"song/{song_id}.json", refresh)
 	if isinstance(detail, dict):
 		return detail
 	raise RuntimeError(f"Unexpected song payload for {song_id}")
 
 
+_SONG_LIST_KEYS = ("songs", "songList", "trackList", "tracks")
+_ALBUM_CORE_KEYS = ("album", "detail", "info")
+
+
+def _first_of_type(record: Dict[str, Any], keys: Tuple[str, ...], expected_type: type) -> Any:
+	"""Return the first ``record[key]`` that is an ``expected_type``, else None."""
+
+	return next((record[k] for k in keys if k in record and isinstance(record[k], expected_type)), None)
+
+
 def extract_album_songs(album_detail: Dict[str, Any]) -> List[Dict[str, Any]]:
-	for key in ("songs", "songList", "trackList", "tracks"):
-		songs = album_detail.get(key)
-		if isinstance(songs, list):
-			return songs
-	return []
+	return _first_of_type(album_detail, _SONG_LIST_KEYS, list) or []
 
 
 def get_album_core(album_detail: Dict[str, Any]) -> Dict[str, Any]:
-	for key in ("album", "detail", "info"):
-		block = album_detail.get(key)
-		if isinstance(block, dict):
-			return block
+	block = _first_of_type(album_detail, _ALBUM_CORE_KEYS, dict)
 	# Sometimes detail already is the album object.
-	return album_detail
+	return block if block is not None else album_detail
 
 
 def collect_artist_names(item: Dict[str, Any]) -> List[str]:
 	artists = item.get("artists") or item.get("artist") or []
 	if isinstance(artists, str):
 		return [artists]
-	if isinstance(artists, list):
-		names: List[str] = []
-		for a in artists:
-			if isinstance(a, str):
-				names.append(a)
-			elif isinstance(a, dict):
-				name = a.get("name") or a.get("title")
-				if name:
-					names.append(str(name))
-		return names
-	return []
+	if not isinstance(artists, list):
+		return []
+	names = [a if isinstance(a, str) else a.get("name") or a.get("title") for a in artists if isinstance(a, (str, dict))]
+	return [str(name) for name in names if name]
 
 
 def build_album_dir(album: Dict[str, Any]) -> Path:
@@ -283,146 +583,469 @@ def build_album_dir(album: Dict[str, Any]) -> Path:
 	return SONGS_DIR / f"{album_id} - {album_name}"
 
 
-def find_existing_track(album_dir: Path, idx: int, ext: str) -> Optional[Path]:
-	pattern = f"{idx:02d} - *{ext}"
-	for candidate in album_dir.glob(pattern):
-		if candidate.is_file():
-			return candidate
-	return None
+def get_album_id(album: Dict[str, Any]) -> str:
+	return str(album.get("cid") or album.get("id") or album.get("albumId"))
 
 
-def main() -> None:
-	logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
-	ensure_dirs()
-	session = requests.Session()
-	session.headers.update(HEADERS)
+def get_song_id(song: Dict[str, Any]) -> str:
+	return str(song.get("cid") or song.get("id") or song.get("songId"))
 
-	albums_payload = fetch_all_albums(session)
-	logging.info("Found %d albums", len(albums_payload))
 
-	albums_meta: List[Dict[str, Any]] = []
-	songs_meta: List[Dict[str, Any]] = []
-	download_tasks: List[Tuple[str, Path]] = []
+def scan_album_dir(album_dir: Path) -> Tuple[Set[str], Dict[Tuple[int, str], Path]]:
+	"""List ``album_dir`` once.
+
+	Returns all file names plus the track files keyed by (track number, extension).
+	"""
+
+	names: Set[str] = set()
+	tracks: Dict[Tuple[int, str], Path] = {}
+	with os.scandir(album_dir) as entries:
+		for entry in entries:
+			names.add(entry.name)
+			match = _TRACK_RE.match(entry.name)
+			if match and entry.is_file():
+				tracks.setdefault((int(match.group(1)), os.path.splitext(entry.name)[1]), Path(entry.path))
+	return names, tracks
 
-	for album_summary in albums_payload:
-		album_id = str(album_summary.get("cid") or album_summary.get("id") or album_summary.get("albumId"))
-		if not album_id:
-			logging.warning("Skipping album with no id: %s", album_summary)
+
+def cover_key(url: str) -> str:
+	return hashlib.blake2b(url.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def link_or_copy(src: Path, dest: Path) -> None:
+	try:
+		os.link(src, dest)
+	except OSError:
+		# No hard links here (e.g. FAT or another volume); copyfile still uses
+		# the kernel's fast copy path where there is one.
+		shutil.copyfile(src, dest)
+
+
+def map_file(path: Path) -> Optional[mmap.mmap]:
+	with path.open("rb") as fh:
+		if os.fstat(fh.fileno()).st_size == 0:
+			return None
+		return mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+class CoverMaps:
+	"""Reference-counted, read-only maps of cover files shared by the taggers.
+
+	FLAC embeds a map as is, ID3 needs a short-lived bytes copy per file. A map
+	is closed as soon as no job holds it any more, so the number of open file
+	descriptors follows the work in flight rather than the number of albums.
+	"""
+
+	def __init__(self) -> None:
+		self._lock = threading.Lock()
+		# key -> [map or None for a missing/empty cover, reference count]
+		self._maps: Dict[str, List[Any]] = {}
+
+	def acquire(self, song: Dict[str, Any], key: Optional[str]) -> Optional[mmap.mmap]:
+		"""Return the cover for ``song``; pair every call with ``release(key)``."""
+
+		if key is None:
+			return None
+		with self._lock:
+			entry = self._maps.get(key)
+			if entry is not None:
+				entry[1] += 1
+				return entry[0]
+		cover_rel = song.get("coverPath")
+		cover_path = ROOT / cover_rel if cover_rel else None
+		cover = map_file(cover_path) if cover_path and cover_path.exists() else None
+		with self._lock:
+			entry = self._maps.setdefault(key, [cover, 0])
+			entry[1] += 1
+		if cover is not None and entry[0] is not cover:
+			# Another worker mapped it first.
+			cover.close()
+		return entry[0]
+
+	def release(self, key: Optional[str]) -> None:
+		if key is None:
+			return
+		with self._lock:
+			entry = self._maps[key]
+			entry[1] -= 1
+			if entry[1]:
+				return
+			del self._maps[key]
+		if entry[0] is not None:
+			entry[0].close()
+
+	def close(self) -> None:
+		with self._lock:
+			entries = list(self._maps.values())
+			self._maps.clear()
+		for cover, _ in entries:
+			if cover is not None:
+				cover.close()
+
+
+def download_worker(
+	session: requests.Session,
+	download_queue: queue.Queue[Optional[DownloadJob]],
+	tag_queue: queue.Queue[Optional[TagJob]],
+	covers: CoverMaps,
+) -> None:
+	"""Download queued files until a ``None`` sentinel arrives.
+
+	MP3s are tagged while they download; everything else goes on to the tag
+	queue once it is on disk.
+	"""
+
+	while True:
+		job = download_queue.get()
+		if job is None:
+			return
+		url, dest, tag_job = job
+		try:
+			if tag_job and dest.suffix.lower() == ".mp3":
+				song, album_name, key, _ = tag_job
+				try:
+					cover = covers.acquire(song, key)
+				except Exception as exc:  # noqa: BLE001
+					# Stream it untagged by art; a later run embeds the cover.
+					logging.error("Failed reading cover for %s: %s", dest, exc)
+					cover, key = None, None
+				try:
+					tag_mp3_stream(
+						session, url, dest, song["title"], album_name, song["artists"], song["trackNo"], cover
+					)
+				finally:
+					covers.release(key)
+				continue
+			download_binary(session, url, dest)
+		except Exception as exc:  # noqa: BLE001
+			logging.error("Failed download %s -> %s: %s", url, dest, exc)
 			continue
+		if tag_job:
+			tag_queue.put(tag_job)
 
-		detail = fetch_album_detail(session, album_id)
+
+def tag_file(
+	path: Path, song: Dict[str, Any], album_name: str, cover_bytes: Optional[CoverData], preexisting: bool = False
+) -> None:
+	try:
+		apply_tags(path, song["title"], album_name, song["artists"], song["trackNo"], cover_bytes, preexisting)
+	except Exception as exc:  # noqa: BLE001
+		logging.error("Failed tagging %s: %s", path, exc)
+
+
+def tag_worker(tag_queue: queue.Queue[Optional[TagJob]], covers: CoverMaps, lock: threading.Lock) -> None:
+	"""Convert and tag queued songs until a ``None`` sentinel arrives.
+
+	Conversions and tagging run on their own pools so a slow ffmpeg run never
+	holds up tagging of the files behind it.
+	"""
+
+	convert_executor = ThreadPoolExecutor(max_workers=CONVERT_WORKERS)
+	tag_executor = ThreadPoolExecutor(max_workers=TAG_WORKERS)
+	# Caps the jobs (and so the cover maps) held by both pools at once.
+	backlog = threading.BoundedSemaphore(TAG_BACKLOG)
+
+	def finish(key: Optional[str], _future: Future[None]) -> None:
+		covers.release(key)
+		backlog.release()
+
+	def tag_converted(
+		song: Dict[str, Any],
+		album_name: str,
+		cover_bytes: Optional[CoverData],
+		preexisting: bool,
+		future: Future[Optional[Path]],
+	) -> None:
+		# The WAV is only tagged after ffmpeg is done reading it.
+		tag_file(ROOT / song["path"], song, album_name, cover_bytes, preexisting)
+		try:
+			flac_path = future.result()
+		except Exception as exc:  # noqa: BLE001
+			logging.error("Failed converting %s: %s", song["path"], exc)
+			return
+		if flac_path:
+			with lock:
+				song["flacPath"] = str(flac_path.relative_to(ROOT))
+			tag_file(flac_path, song, album_name, cover_bytes)
+
+	def on_converted(
+		song: Dict[str, Any],
+		album_name: str,
+		key: Optional[str],
+		cover_bytes: Optional[CoverData],
+		preexisting: bool,
+		future: Future[Optional[Path]],
+	) -> None:
+		tagged = tag_executor.submit(tag_converted, song, album_name, cover_bytes, preexisting, future)
+		tagged.add_done_callback(partial(finish, key))
+
+	try:
+		while True:
+			job = tag_queue.get()
+			if job is None:
+				break
+			song, album_name, key, preexisting = job
+			audio_path = ROOT / song["path"]
+			backlog.acquire()
+			try:
+				cover_bytes = covers.acquire(song, key)
+			except Exception as exc:  # noqa: BLE001
+				logging.error("Failed reading cover for %s: %s", audio_path, exc)
+				backlog.release()
+				continue
+			if audio_path.suffix.lower() == ".wav":
+				future = convert_executor.submit(convert_wav_to_flac, audio_path)
+				future.add_done_callback(partial(on_converted, song, album_name, key, cover_bytes, preexisting))
+			else:
+				tagged = tag_executor.submit(tag_file, audio_path, song, album_name, cover_bytes, preexisting)
+				tagged.add_done_callback(partial(finish, key))
+	finally:
+		# Conversions submit follow-up tagging, so drain them first.
+		convert_executor.shutdown(wait=True)
+		tag_executor.shutdown(wait=True)
+
+
+async def produce_metadata(
+	session: requests.Session,
+	refresh: bool,
+	download_queue: queue.Queue[Optional[DownloadJob]],
+	tag_queue: queue.Queue[Optional[TagJob]],
+	albums_meta: List[Dict[str, Any]],
+	songs_meta: List[Dict[str, Any]],
+	lock: threading.Lock,
+) -> List[str]:
+	"""Fetch all album/song details and feed the download and tag queues.
+
+	Each song is queued as soon as its own detail arrives, so downloads start
+	while the rest of the metadata is still in flight. Details come from
+	CACHE_DIR unless ``refresh`` is set, in which case they are revalidated. Returns album ids in listing order.
+	"""
+
+	semaphore = asyncio.Semaphore(METADATA_CONCURRENCY)
+	loop = asyncio.get_running_loop()
+	covers_by_hash: Dict[str, asyncio.Lock] = {}
+
+	async def limited(coro: Any) -> Any:
+		async with semaphore:
+			return await coro
+
+	async def process_song(
+		client: httpx.AsyncClient,
+		album_id: str,
+		album_name: str,
+		album_dir: Path,
+		existing_files: Set[str],
+		existing_tracks: Dict[Tuple[int, str], Path],
+		cover_path: Optional[Path],
+		cover_id: Optional[str],
+		idx: int,
+		song_id: str,
+	) -> None:
+		song_detail = await limited(fetch_song_detail(client, song_id, refresh))
+		song_core = song_detail.get("song") if isinstance(song_detail, dict) else None
+		if not song_core:
+			song_core = song_detail if isinstance(song_detail, dict) else {}
+
+		audio_url = extract_song_audio(song_core)
+		if not audio_url:
+			logging.warning("No audio URL for song %s", song_id)
+			return
+
+		ext = parse_extension_from_url(audio_url)
+		title = song_core.get("name") or song_core.get("title") or song_id
+		artists = collect_artist_names(song_core)
+
+		filename = f"{idx:02d} - {slugify(title)}{ext}"
+		existing = existing_tracks.get((idx, ext))
+		audio_path = existing or (album_dir / filename)
+
+		song_record = {
+			"id": song_id,
+			"albumId": album_id,
+			"title": title,
+			"artists": artists,
+			"trackNo": idx,
+			"path": str(audio_path.relative_to(ROOT)),
+			"coverPath": str(cover_path.relative_to(ROOT)) if cover_path else None,
+			"raw": song_core,
+		}
+		with lock:
+			songs_meta.append(song_record)
+
+		if audio_path.name in existing_files:
+			tag_queue.put((song_record, album_name, cover_id, True))
+		else:
+			download_queue.put((audio_url, audio_path, (song_record, album_name, cover_id, False)))
+
+	async def place_cover(url: str, key: str, dest: Path) -> None:
+		# Albums often share art; fetch each URL once into COVERS_DIR and link it.
+		shared = COVERS_DIR / f"{key}.jpg"
+		async with covers_by_hash.setdefault(key, asyncio.Lock()):
+			if not shared.exists():
+				await loop.run_in_executor(None, download_binary, session, url, shared)
+		link_or_copy(shared, dest)
+
+	async def process_album(client: httpx.AsyncClient, album_id: str) -> None:
+		detail = await limited(fetch_album_detail(client, album_id, refresh))
 		album_core = get_album_core(detail)
 		album_dir = build_album_dir(album_core)
 		album_dir.mkdir(parents=True, exist_ok=True)
+		# One directory scan per album instead of a stat or glob per asset.
+		existing_files, existing_tracks = scan_album_dir(album_dir)
 
 		cover_url = extract_album_cover(album_core)
 		bg_url = extract_background(album_core)
 
 		cover_path = album_dir / "cover.jpg" if cover_url else None
+		cover_id = cover_key(cover_url) if cover_url else None
 		bg_path = album_dir / "background.jpg" if bg_url else None
 
-		if cover_url and cover_path and not cover_path.exists():
-			download_tasks.append((cover_url, cover_path))
-		if bg_url and bg_path and not bg_path.exists():
-			download_tasks.append((bg_url, bg_path))
-
+		# Songs are tagged with the cover, so it must be on disk before any of
+		# them reach the tag queue.
+		if cover_url and cover_id and cover_path and cover_path.name not in existing_files:
+			try:
+				await place_cover(cover_url, cover_id, cover_path)
+			except Exception as exc:  # noqa: BLE001
+				logging.error("Failed download %s -> %s: %s", cover_url, cover_path, exc)
+		if bg_url and bg_path and bg_path.name not in existing_files:
+			download_queue.put((bg_url, bg_path, None))
+
+		album_name = album_core.get("name") or album_core.get("title")
 		album_record = {
 			"id": album_id,
-			"name": album_core.get("name") or album_core.get("title"),
+			"name": album_name,
 			"artists": collect_artist_names(album_core),
 			"cover": str(cover_path.relative_to(ROOT)) if cover_path else None,
 			"background": str(bg_path.relative_to(ROOT)) if bg_path else None,
 			"raw": album_core,
 		}
-		albums_meta.append(album_record)
+		with lock:
+			albums_meta.append(album_record)
 
 		songs_in_album = extract_album_songs(detail)
 		if not songs_in_album:
 			logging.warning("No songs listed for album %s", album_id)
-			continue
+			return
 
+		song_tasks = []
 		for idx, song_stub in enumerate(songs_in_album, start=1):
-			song_id = str(song_stub.get("cid") or song_stub.get("id") or song_stub.get("songId"))
+			song_id = get_song_id(song_stub)
 			if not song_id:
 				logging.warning("Skipping song with no id in album %s", album_id)
 				continue
+			song_tasks.append(
+				process_song(
+					client,
+					album_id,
+					album_name or album_id,
+					album_dir,
+					existing_files,
+					existing_tracks,
+					cover_path,
+					cover_id,
+					idx,
+					song_id,
+				)
+			)
+		await asyncio.gather(*song_tasks)
 
-			song_detail = fetch_song_detail(session, song_id)
-			song_core = song_detail.get("song") if isinstance(song_detail, dict) else None
-			if not song_core:
-				song_core = song_detail if isinstance(song_detail, dict) else {}
+	async with httpx.AsyncClient(http2=True, headers=HEADERS) as client:
+		albums_payload = await fetch_all_albums(client)
+		logging.info("Found %d albums", len(albums_payload))
 
-			audio_url = extract_song_audio(song_core)
-			if not audio_url:
-				logging.warning("No audio URL for song %s", song_id)
+		album_ids: List[str] = []
+		for album_summary in albums_payload:
+			album_id = get_album_id(album_summary)
+			if not album_id:
+				logging.warning("Skipping album with no id: %s", album_summary)
 				continue
+			album_ids.append(album_id)
+
+		# Asset hosts are known from the listing already; connect to them in the
+		# background while album details are still being fetched. Nothing waits
+		# for these.
+		origins = {
+			f"{parts.scheme}://{parts.netloc}/"
+			for parts in (urlparse(url) for url in map(extract_album_cover, albums_payload) if url)
+		}
+		for origin in origins:
+			threading.Thread(target=warm_connection, args=(session, origin), daemon=True).start()
 
-			ext = parse_extension_from_url(audio_url)
-			title = song_core.get("name") or song_core.get("title") or song_id
-			artists = collect_artist_names(song_core)
-
-			filename = f"{idx:02d} - {slugify(title)}{ext}"
-			existing = find_existing_track(album_dir, idx, ext)
-			audio_path = existing or (album_dir / filename)
-
-			if not audio_path.exists():
-				download_tasks.append((audio_url, audio_path))
-
-			song_record = {
-				"id": song_id,
-				"albumId": album_id,
-				"title": title,
-				"artists": artists,
-				"trackNo": idx,
-				"path": str(audio_path.relative_to(ROOT)),
-				"coverPath": str(cover_path.relative_to(ROOT)) if cover_path else None,
-				"raw": song_core,
-			}
-			songs_meta.append(song_record)
+		await asyncio.gather(*(process_album(client, album_id) for album_id in album_ids))
 
-	if download_tasks:
-		logging.info("Starting %d parallel downloads", len(download_tasks))
-		with ThreadPoolExecutor(max_workers=8) as executor:
-			future_map = {executor.submit(download_binary, session, url, dest): (url, dest) for url, dest in download_tasks}
-			for future in as_completed(future_map):
-				url, dest = future_map[future]
-				try:
-					future.result()
-				except Exception as exc:  # noqa: BLE001
-					logging.error("Failed download %s -> %s: %s", url, dest, exc)
-	else:
-		logging.info("No downloads needed; assets already present")
+	return album_ids
 
-	# After all downloads finish, convert and tag.
-	album_name_by_id = {a["id"]: a.get("name") or a["id"] for a in albums_meta}
 
-	for song in songs_meta:
-		audio_path = ROOT / song["path"]
-		cover_rel = song.get("coverPath")
-		cover_path = ROOT / cover_rel if cover_rel else None
+def drain_queue(q: queue.Queue[Any]) -> None:
+	"""Drop every job still waiting in ``q``."""
 
-		flac_path = None
-		if audio_path.suffix.lower() == ".wav":
-			flac_path = convert_wav_to_flac(audio_path)
-
-		apply_tags(
-			audio_path,
-			song["title"],
-			album_name_by_id.get(song["albumId"], song["albumId"]),
-			song["artists"],
-			song["trackNo"],
-			cover_path,
-		)
-		if flac_path:
-			apply_tags(
-				flac_path,
-				song["title"],
-				album_name_by_id.get(song["albumId"], song["albumId"]),
-				song["artists"],
-				song["trackNo"],
-				cover_path,
+	while True:
+		try:
+			q.get_nowait()
+		except queue.Empty:
+			return
+
+
+def main() -> None:
+	parser = argparse.ArgumentParser(description="Download everything from Monster Siren.")
+	parser.add_argument("--refresh", action="store_true", help="revalidate cached album/song details")
+	args = parser.parse_args()
+
+	logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+	# httpx logs every request at INFO, which drowns out our own progress output.
+	logging.getLogger("httpx").setLevel(logging.WARNING)
+	ensure_dirs()
+	load_etags()
+	atexit.register(save_etags)
+	session = requests.Session()
+	session.headers.update(HEADERS)
+	# Size the connection pool so download workers never wait for a free socket,
+	# and let urllib3 retry transient connection failures itself.
+	adapter = HTTPAdapter(pool_connections=32, pool_maxsize=32, max_retries=Retry(total=3, backoff_factor=0.2))
+	session.mount("https://", adapter)
+	session.mount("http://", adapter)
+
+	albums_meta: List[Dict[str, Any]] = []
+	songs_meta: List[Dict[str, Any]] = []
+	lock = threading.Lock()
+	# Tracks sharing a cover embed the same mapped file while they are in flight.
+	covers = CoverMaps()
+	download_queue: queue.Queue[Optional[DownloadJob]] = queue.Queue()
+	tag_queue: queue.Queue[Optional[TagJob]] = queue.Queue()
+
+	# Metadata, downloads and tagging run as one pipeline: downloads start as
+	# soon as the first song detail arrives, tagging as soon as a file lands.
+	with ThreadPoolExecutor(max_workers=DOWNLOAD_WORKERS + 1) as executor:
+		download_futures = [
+			executor.submit(download_worker, session, download_queue, tag_queue, covers)
+			for _ in range(DOWNLOAD_WORKERS)
+		]
+		tag_future = executor.submit(tag_worker, tag_queue, covers, lock)
+		aborted = True
+		try:
+			album_ids = asyncio.run(
+				produce_metadata(session, args.refresh, download_queue, tag_queue, albums_meta, songs_meta, lock)
 			)
-			song["flacPath"] = str(flac_path.relative_to(ROOT))
+			aborted = False
+		finally:
+			# On Ctrl-C or a metadata error, only let the in-flight work finish.
+			if aborted:
+				drain_queue(download_queue)
+			for _ in download_futures:
+				download_queue.put(None)
+			wait(download_futures)
+			if aborted:
+				drain_queue(tag_queue)
+			tag_queue.put(None)
+			try:
+				tag_future.result()
+			finally:
+				covers.close()
+
+	# Workers finish in arbitrary order; keep the saved metadata in listing order.
+	album_order = {album_id: pos for pos, album_id in enumerate(album_ids)}
+	albums_meta.sort(key=lambda a: album_order[a["id"]])
+	songs_meta.sort(key=lambda s: (album_order[s["albumId"]], s["trackNo"]))
 
 	save_json(METADATA_DIR / "albums.json", albums_meta)
 	save_json(METADATA_DIR / "songs.json", songs_meta)